@@ -7,25 +7,52 @@ A MCP server that allows you to generate images using simple text commands. Tran
 Features:
 - Image generation from text prompts using Google's Gemini models
 - Image modification based on text instructions
+- Batch image generation from multiple prompts
 
 Required environment variables:
 - GEMINI_API_KEY: Your Google Gemini API key
 
+Optional environment variables:
+- PROMPTSHOP_LOG: Log level written to stderr (default: INFO, use DEBUG for progress details)
+
 Usage:
 1. Set the required environment variables
 2. Run the server using FastMCP
 3. Use the provided tools to generate images
 """
 from mcp.server.fastmcp import FastMCP
+import asyncio
+import functools
 import os
-import tempfile
-import requests
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import httpx
 from io import BytesIO
-from PIL import Image
 import hashlib
-from google import genai
-from google.genai import types
+import itertools
+import json
+import logging
+import re
+import sqlite3
 import sys
+import threading
+
+# google.genai is imported where it is used, it is slow to load and not needed
+# until the first image is processed
+
+# Log to stderr (won't interfere with JSON RPC); set PROMPTSHOP_LOG=DEBUG for progress details
+logger = logging.getLogger("promptshop")
+log_handler = logging.StreamHandler(sys.stderr)
+log_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+logger.addHandler(log_handler)
+logger.propagate = False
+log_level = (os.environ.get("PROMPTSHOP_LOG") or "INFO").upper()
+if isinstance(logging.getLevelName(log_level), int):
+    logger.setLevel(log_level)
+else:
+    logger.setLevel(logging.INFO)
+    logger.warning("Unknown PROMPTSHOP_LOG level %r, using INFO", log_level)
 
 # Create an MCP server
 mcp = FastMCP("PromptShopMCP")
@@ -34,12 +61,72 @@ mcp = FastMCP("PromptShopMCP")
 IMAGES_DIR = os.path.join(os.getcwd(), "generated_images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
-# Track generated files
-generated_files = {}
-
-# Helper function for logging to stderr (won't interfere with JSON RPC)
-def log_debug(message):
-    print(message, file=sys.stderr, flush=True)
+# Directory mapping identical generation requests to their earlier result
+RESPONSE_CACHE_DIR = os.path.join(IMAGES_DIR, ".cache")
+os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+
+# Largest image accepted for download or modification
+MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB limit
+
+# Image types accepted for download, matching IMAGE_SIGNATURES below
+ALLOWED_IMAGE_TYPES = frozenset({"image/jpeg", "image/png", "image/webp", "image/gif"})
+
+# Leading bytes of the accepted image formats (JPEG, PNG, GIF); WebP is
+# checked separately since its signature is split around the file size
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+# Track generated files, oldest first; past MAX_TRACKED_FILES the oldest
+# entries are dropped and their files deleted
+MAX_TRACKED_FILES = 500
+generated_files = OrderedDict()
+generated_file_ids = itertools.count()
+
+# Recently served image bytes by path, oldest first, bounded by total size
+IMAGE_BYTES_CACHE_SIZE = 64 * 1024 * 1024
+image_bytes_cache = OrderedDict()
+image_bytes_cache_size = 0
+
+# On-disk index of generated_files, so images stay available across restarts;
+# written from worker threads, one transaction at a time under index_db_lock
+index_db = sqlite3.connect(os.path.join(IMAGES_DIR, "index.db"), check_same_thread=False)
+index_db_lock = threading.Lock()
+with index_db:
+    index_db.execute(
+        "CREATE TABLE IF NOT EXISTS imgs"
+        "(id TEXT PRIMARY KEY, path TEXT, name TEXT, mime TEXT, prompt TEXT, src TEXT, cache_key TEXT)"
+    )
+
+# Bumped on every change to generated_files, used to invalidate image_list_cache
+generated_files_version = 0
+image_list_cache = (-1, "")
+
+# Gemini file uploads keyed by API key and image content hash, oldest first;
+# reused only while they stay valid for at least GEMINI_UPLOAD_EXPIRY_MARGIN
+GEMINI_UPLOAD_CACHE_SIZE = 1000
+GEMINI_UPLOAD_EXPIRY_MARGIN = timedelta(minutes=5)
+gemini_upload_cache = OrderedDict()
+# Uploads currently running, so concurrent calls for one image upload it once
+gemini_uploads_in_progress = {}
+
+# Shared HTTP client, created lazily on first use so connections are pooled
+http_client = None
+DOWNLOAD_HEADERS = {
+    "User-Agent": "GeminiImageModifier/1.0"
+}
+
+# Generation settings shared by every Gemini request
+GENERATION_CONFIG_DEFAULTS = {
+    "max_output_tokens": 8192,
+    "response_modalities": ["image", "text"],
+    "response_mime_type": "text/plain",
+}
+
+# Shared Gemini client as (api_key, client), replaced when the key changes
+gemini_client = None
+gemini_client_lock = threading.Lock()
+
+# Limit concurrent Gemini requests to stay within API rate limits
+gemini_semaphore = asyncio.Semaphore(5)
 
 def is_safe_image(image_data):
     """
@@ -51,29 +138,201 @@ def is_safe_image(image_data):
     Returns:
     - Boolean indicating if image appears safe
     """
+    # Check file size first (prevent excessively large images)
+    if len(image_data) > MAX_IMAGE_SIZE:
+        return False
+
+    # Basic validation that this is a supported image file, from its signature
+    header = image_data[:12]
+    if not (header.startswith(IMAGE_SIGNATURES) or (header[:4] == b"RIFF" and header[8:12] == b"WEBP")):
+        logger.warning("Image safety check failed: unrecognized image format")
+        return False
+
+    # Additional checks could be added here
+    # - AI-based content moderation
+    # - More sophisticated image analysis
+
+    return True
+
+def write_file(path, data):
+    """
+    Write binary data to a file, replacing any existing content atomically
+    so readers never see a partially written file
+    """
+    temp_path = f"{path}.{os.urandom(4).hex()}.tmp"
+    # Write straight to the file descriptor, skipping the buffered IO layer
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     try:
-        # Basic validation that this is a valid image file
-        img = Image.open(BytesIO(image_data))
-        img.verify()
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
-        # Check file size (prevent excessively large images)
-        if len(image_data) > 10 * 1024 * 1024:  # 10MB limit
-            return False
+async def upload_to_gemini(client, api_key, image_data, mime_type, image_digest):
+    """
+    Upload an image to the Gemini Files API, reusing a previous upload of
+    identical content while it has not expired
+    
+    Parameters:
+    - client: Gemini client
+    - api_key: API key the client was created with, uploads are only visible to its project
+    - image_data: Binary image data
+    - mime_type: MIME type of the image
+    - image_digest: Content hash of image_data
+    
+    Returns:
+    - The uploaded Gemini file
+    """
+    api_key_digest = hashlib.blake2b(api_key.encode("utf-8"), digest_size=8).hexdigest()
+    cache_key = f"{api_key_digest}:{mime_type}:{image_digest}"
+    cached_file = gemini_upload_cache.get(cache_key)
+    if cached_file is not None:
+        # Leave a margin so the file doesn't expire before generate_content uses it
+        expires_after = datetime.now(timezone.utc) + GEMINI_UPLOAD_EXPIRY_MARGIN
+        if cached_file.expiration_time is None or cached_file.expiration_time > expires_after:
+            gemini_upload_cache.move_to_end(cache_key)
+            logger.debug("Reusing uploaded file: %s", cached_file.uri)
+            return cached_file
+        del gemini_upload_cache[cache_key]
+
+    # Join an upload of the same image that is already in progress
+    upload = gemini_uploads_in_progress.get(cache_key)
+    if upload is None:
+        async def start_upload():
+            # Upload straight from memory, no temporary file needed
+            async with gemini_semaphore:
+                uploaded_file = await client.aio.files.upload(
+                    file=BytesIO(image_data),
+                    config={"mime_type": mime_type}
+                )
+
+            gemini_upload_cache[cache_key] = uploaded_file
+            if len(gemini_upload_cache) > GEMINI_UPLOAD_CACHE_SIZE:
+                gemini_upload_cache.popitem(last=False)
+            return uploaded_file
+
+        upload = asyncio.create_task(start_upload())
+        gemini_uploads_in_progress[cache_key] = upload
+        upload.add_done_callback(lambda _: gemini_uploads_in_progress.pop(cache_key, None))
+    else:
+        logger.debug("Waiting for an upload of the same image already in progress")
 
-        # Calculate image hash for potential blacklist checking
-        # (Could be expanded to check against known unsafe image hashes)
-        image_hash = hashlib.md5(image_data).hexdigest()
+    # Shielded so a cancelled caller doesn't abort the upload for the others
+    return await asyncio.shield(upload)
 
-        # Additional checks could be added here
-        # - AI-based content moderation
-        # - More sophisticated image analysis
+def get_http_client():
+    """
+    Get the shared async HTTP client, creating it on first use
+    """
+    global http_client
+    if http_client is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            retries=3
+        )
+        http_client = httpx.AsyncClient(
+            transport=transport,
+            headers=DOWNLOAD_HEADERS,
+            timeout=10,
+            follow_redirects=True
+        )
+    return http_client
 
-        return True
-    except Exception as e:
-        log_debug(f"Image safety check failed: {str(e)}")
-        return False
+def response_cache_key(model, prompt, temperature, top_p, top_k, image_digest=""):
+    """
+    Build the response cache key for a generation request
+    
+    Parameters:
+    - model: Gemini model name
+    - prompt: Text instruction, compared case and whitespace insensitively
+    - temperature, top_p, top_k: Generation parameters
+    - image_digest: Digest of the input image, if any
+    
+    Returns:
+    - Hex string identifying the request
+    """
+    normalized_prompt = re.sub(r"\s+", " ", prompt.strip().lower())
+    key_source = "\n".join([model, image_digest, normalized_prompt, repr((temperature, top_p, top_k))])
+    return hashlib.blake2b(key_source.encode("utf-8"), digest_size=16).hexdigest()
 
-def download_image(url):
+def get_cached_response(cache_key):
+    """
+    Get the image generated earlier for an identical request
+    
+    Returns:
+    - Local file path of the cached image, or None if there is none
+    """
+    sidecar_path = os.path.join(RESPONSE_CACHE_DIR, f"{cache_key}.json")
+    try:
+        with open(sidecar_path, "rb") as f:
+            path = json.load(f)["path"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if os.path.exists(path):
+        return path
+
+    # The image is gone, drop the entry pointing to it
+    try:
+        os.unlink(sidecar_path)
+    except OSError:
+        pass
+    return None
+
+def cache_response(cache_key, path):
+    """
+    Remember the image generated for a request
+    """
+    write_file(os.path.join(RESPONSE_CACHE_DIR, f"{cache_key}.json"), json.dumps({"path": path}).encode("utf-8"))
+
+def remove_cached_response(cache_key, path):
+    """
+    Forget the cached response for a request if it still points to path
+    """
+    sidecar_path = os.path.join(RESPONSE_CACHE_DIR, f"{cache_key}.json")
+    try:
+        with open(sidecar_path, "rb") as f:
+            if json.load(f).get("path") != path:
+                return
+        os.unlink(sidecar_path)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+@functools.lru_cache(maxsize=64)
+def get_generate_content_config(temperature, top_p, top_k):
+    """
+    Get the Gemini generation config for the given sampling parameters,
+    validated once per combination and shared between requests
+    """
+    from google.genai import types
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        top_p=top_p,
+        top_k=top_k,
+        **GENERATION_CONFIG_DEFAULTS
+    )
+
+def get_gemini_client(api_key):
+    """
+    Get the shared Gemini client for an API key, creating it on first use.
+    Called from worker threads, so creation is serialised by gemini_client_lock.
+    """
+    global gemini_client
+    with gemini_client_lock:
+        if gemini_client is None or gemini_client[0] != api_key:
+            from google import genai
+            gemini_client = (api_key, genai.Client(api_key=api_key))
+        return gemini_client[1]
+
+async def download_image(url):
     """
     Download an image from a URL
     
@@ -84,41 +343,182 @@ def download_image(url):
     - Tuple of (success_boolean, image_data_or_error_message)
     """
     try:
-        # Set a timeout and user agent for the request
-        headers = {
-            "User-Agent": "GeminiImageModifier/1.0"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-
-        # Check if request was successful
-        if response.status_code == 200:
-            # Check content type is an image
-            content_type = response.headers.get('Content-Type', '')
-            if not content_type.startswith('image/'):
-                return False, f"Not an image: Content-Type is {content_type}"
-
-            # Get image data
-            image_data = response.content
-
-            # Check image safety
-            if is_safe_image(image_data):
-                return True, image_data
-            else:
-                return False, "Image failed safety checks"
+        # Stream the response so the body is only read once the headers are accepted
+        async with get_http_client().stream("GET", url) as response:
+            # Check if request was successful
+            if response.status_code != 200:
+                return False, f"Failed to download image: HTTP {response.status_code}"
+
+            # Check content type is a supported image type
+            content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+            if content_type not in ALLOWED_IMAGE_TYPES:
+                return False, f"Not a supported image: Content-Type is {content_type}"
+
+            # Reject oversized images before reading the body when the size is known
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_SIZE:
+                return False, f"Image too large: {content_length} bytes"
+
+            # Get image data, aborting as soon as the size limit is exceeded
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes(65536):
+                size += len(chunk)
+                if size > MAX_IMAGE_SIZE:
+                    return False, f"Image too large: more than {MAX_IMAGE_SIZE} bytes"
+                chunks.append(chunk)
+            image_data = b"".join(chunks)
+
+        # Check image safety
+        if is_safe_image(image_data):
+            return True, image_data
         else:
-            return False, f"Failed to download image: HTTP {response.status_code}"
+            return False, "Image failed safety checks"
 
     except Exception as e:
         return False, f"Error downloading image: {str(e)}"
 
+async def track_generated_file(info):
+    """
+    Record a generated image so it can be served through the resources
+    
+    Parameters:
+    - info: Dictionary describing the generated image (path, name, mime_type, prompt, ...)
+    
+    Returns:
+    - ID assigned to the image
+    """
+    global generated_files_version
+    file_id = f"gen_{next(generated_file_ids)}"
+    generated_files[file_id] = info
+    evicted = []
+    while len(generated_files) > MAX_TRACKED_FILES:
+        evicted.append(generated_files.popitem(last=False))
+        # Don't keep serving bytes of deleted files
+        forget_image_bytes(evicted[-1][1]["path"])
+    generated_files_version += 1
+
+    # Update the index and delete evicted files without blocking the event loop
+    await asyncio.to_thread(store_generated_file, file_id, info, evicted)
+    return file_id
+
+def store_generated_file(file_id, info, evicted):
+    """
+    Write a newly tracked image to the index and remove the evicted ones,
+    including their files and cached responses
+    
+    Parameters:
+    - file_id: ID of the new image
+    - info: Dictionary describing the new image
+    - evicted: List of (file_id, info) pairs dropped from generated_files
+    """
+    with index_db_lock, index_db:
+        index_db.execute(
+            "INSERT OR REPLACE INTO imgs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_id, info["path"], info["name"], info["mime_type"], info["prompt"], info.get("source_url"), info.get("cache_key"))
+        )
+        index_db.executemany("DELETE FROM imgs WHERE id = ?", [(evicted_id,) for evicted_id, _ in evicted])
+    for _, evicted_info in evicted:
+        try:
+            os.unlink(evicted_info["path"])
+        except OSError:
+            pass
+        if evicted_info.get("cache_key"):
+            remove_cached_response(evicted_info["cache_key"], evicted_info["path"])
+
+def load_generated_files():
+    """
+    Restore the generated files recorded by previous runs from the index
+    """
+    global generated_file_ids
+    last_id = -1
+    missing_ids = []
+    for file_id, path, name, mime_type, prompt, source_url, cache_key in index_db.execute(
+        "SELECT id, path, name, mime, prompt, src, cache_key FROM imgs ORDER BY rowid"
+    ).fetchall():
+        last_id = max(last_id, int(file_id.removeprefix("gen_")))
+        # Forget images whose file was deleted in the meantime
+        if not os.path.exists(path):
+            missing_ids.append((file_id,))
+            continue
+        info = {"path": path, "name": name, "mime_type": mime_type, "prompt": prompt}
+        if source_url is not None:
+            info["source_url"] = source_url
+        if cache_key is not None:
+            info["cache_key"] = cache_key
+        generated_files[file_id] = info
+    with index_db:
+        index_db.executemany("DELETE FROM imgs WHERE id = ?", missing_ids)
+    generated_file_ids = itertools.count(last_id + 1)
+
+load_generated_files()
+
+def read_image_bytes(path):
+    """
+    Read an image file, keeping recently served images in memory
+    """
+    global image_bytes_cache_size
+    image_data = image_bytes_cache.get(path)
+    if image_data is not None:
+        image_bytes_cache.move_to_end(path)
+        return image_data
+
+    with open(path, "rb") as f:
+        image_data = f.read()
+
+    # Serve images larger than the whole cache without pushing the others out
+    if len(image_data) > IMAGE_BYTES_CACHE_SIZE:
+        return image_data
+
+    image_bytes_cache[path] = image_data
+    image_bytes_cache_size += len(image_data)
+    while image_bytes_cache_size > IMAGE_BYTES_CACHE_SIZE:
+        _, evicted = image_bytes_cache.popitem(last=False)
+        image_bytes_cache_size -= len(evicted)
+    return image_data
+
+def forget_image_bytes(path):
+    """
+    Drop an image from the in-memory cache of read_image_bytes
+    """
+    global image_bytes_cache_size
+    image_data = image_bytes_cache.pop(path, None)
+    if image_data is not None:
+        image_bytes_cache_size -= len(image_data)
+
+def extract_image(response):
+    """
+    Find the generated image in a Gemini response
+    
+    Parameters:
+    - response: Gemini GenerateContentResponse
+    
+    Returns:
+    - Tuple of (image_data_or_None, mime_type_or_None, text_response)
+    """
+    parts = []
+    if response.candidates and response.candidates[0].content:
+        parts = response.candidates[0].content.parts or []
+
+    text_parts = []
+    for part in parts:
+        # Check for inline image data
+        inline_data = part.inline_data
+        if inline_data:
+            logger.debug("Received inline image data: %s", inline_data.mime_type)
+            return inline_data.data, inline_data.mime_type, "".join(text_parts)
+        # Collect text response
+        if part.text:
+            text_parts.append(part.text)
+    return None, None, "".join(text_parts)
+
 @mcp.resource("generated-image://{image_id}")
 def get_generated_image(image_id: str) -> bytes:
     """
     Get a previously generated image by its ID
     """
     if image_id in generated_files:
-        with open(generated_files[image_id]["path"], "rb") as f:
-            return f.read()
+        return read_image_bytes(generated_files[image_id]["path"])
     else:
         return f"Error: Image with ID {image_id} not found"
 
@@ -138,13 +538,16 @@ def list_images() -> str:
     """
     List all generated images
     """
-    result = "Generated images:\n"
-    for img_id, info in generated_files.items():
-        result += f"- {img_id}: {info['name']} ({info['mime_type']})\n"
-    return result
+    global image_list_cache
+    if image_list_cache[0] != generated_files_version:
+        parts = ["Generated images:\n"]
+        for img_id, info in generated_files.items():
+            parts.append(f"- {img_id}: {info['name']} ({info['mime_type']})\n")
+        image_list_cache = (generated_files_version, "".join(parts))
+    return image_list_cache[1]
 
 @mcp.tool()
-def generate_image_from_url(
+async def generate_image_from_url(
     image_url: str,
     prompt: str,
     mime_type: str = "image/jpeg",
@@ -172,116 +575,90 @@ def generate_image_from_url(
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set")
 
-    # Download image from URL
-    success, result = download_image(image_url)
+    # Download image from URL, meanwhile getting the shared Gemini client
+    # (on first use this also loads google.genai, which takes a while)
+    (success, result), client = await asyncio.gather(
+        download_image(image_url),
+        asyncio.to_thread(get_gemini_client, api_key)
+    )
     if not success:
         raise ValueError(f"Error downloading image from URL: {result}")
 
-    # Create a temporary file for the downloaded image
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-        temp_file.write(result)
-        temp_file_path = temp_file.name
-
-    try:
-        # Initialize Gemini client
-        client = genai.Client(api_key=api_key)
-
-        # Upload file to Gemini
-        uploaded_file = client.files.upload(
-            file=temp_file_path,
-            config={"mime_type": mime_type}
-        )
-
-        # Create a conversation history with the uploaded image
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_uri(
-                        file_uri=uploaded_file.uri,
-                        mime_type=mime_type,
-                    ),
-                    types.Part.from_text(text=prompt),
-                ]
-            ),
-        ]
-
-        # Configure the generation request
-        generate_content_config = types.GenerateContentConfig(
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            max_output_tokens=8192,
-            response_modalities=["image", "text"],
-            response_mime_type="text/plain",
-        )
-
-        # Use streaming to capture the response chunks
-        image_data = None
-        response_mime_type = None
-        text_response = ""
-
-        # Process the streamed response
-        for chunk in client.models.generate_content_stream(
-            model="gemini-2.0-flash-exp",
+    from google.genai import types
+
+    # Return the earlier result of an identical request
+    model = "gemini-2.0-flash-exp"
+    image_digest = hashlib.blake2b(result, digest_size=16).hexdigest()
+    cache_key = response_cache_key(model, prompt, temperature, top_p, top_k, f"{mime_type}:{image_digest}")
+    cached_path = await asyncio.to_thread(get_cached_response, cache_key)
+    if cached_path:
+        logger.debug("Returning cached image: %s", cached_path)
+        return cached_path
+
+    # Upload file to Gemini (reused if this image was uploaded before)
+    uploaded_file = await upload_to_gemini(client, api_key, result, mime_type, image_digest)
+
+    # Create a conversation history with the uploaded image
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_uri(
+                    file_uri=uploaded_file.uri,
+                    mime_type=mime_type,
+                ),
+                types.Part.from_text(text=prompt),
+            ]
+        ),
+    ]
+
+    # Configure the generation request
+    generate_content_config = get_generate_content_config(temperature, top_p, top_k)
+
+    # Request the whole response at once, only a single image is expected
+    async with gemini_semaphore:
+        response = await client.aio.models.generate_content(
+            model=model,
             contents=contents,
             config=generate_content_config,
-        ):
-            if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
-                continue
-
-            # Check for inline image data
-            if hasattr(chunk.candidates[0].content.parts[0], 'inline_data') and chunk.candidates[0].content.parts[0].inline_data:
-                image_data = chunk.candidates[0].content.parts[0].inline_data.data
-                response_mime_type = chunk.candidates[0].content.parts[0].inline_data.mime_type
-                log_debug(f"Received inline image data: {response_mime_type}")
-                break  # Once we have the image, we can stop processing
-            # Accumulate text response
-            elif hasattr(chunk, 'text') and chunk.text:
-                text_response += chunk.text
+        )
 
-        # If we found inline image data
-        if image_data:
-            # Save generated image to a file for history tracking
-            import time
-            output_file_name = f"generated_{int(time.time())}.jpg"
-            output_file_path = os.path.join(IMAGES_DIR, output_file_name)
+    image_data, response_mime_type, text_response = extract_image(response)
 
-            # Save to file
-            with open(output_file_path, "wb") as f:
-                f.write(image_data)
+    # If we found inline image data
+    if image_data:
+        # Save generated image to a file for history tracking
+        output_file_name = f"generated_{time.time_ns()}_{os.urandom(3).hex()}.jpg"
+        output_file_path = os.path.join(IMAGES_DIR, output_file_name)
 
-            # Store generated file info
-            file_id = f"gen_{len(generated_files)}"
-            generated_files[file_id] = {
-                "path": output_file_path,
-                "name": output_file_name,
-                "mime_type": response_mime_type or "image/jpeg",
-                "prompt": prompt,
-                "source_url": image_url
-            }
+        # Save to file without blocking the event loop
+        await asyncio.to_thread(write_file, output_file_path, image_data)
 
-            # Return the local file path
-            log_debug(f"Image saved to: {output_file_path}")
-            return output_file_path
+        # Remember it for identical requests and store generated file info
+        await asyncio.to_thread(cache_response, cache_key, output_file_path)
+        await track_generated_file({
+            "path": output_file_path,
+            "name": output_file_name,
+            "mime_type": response_mime_type or "image/jpeg",
+            "prompt": prompt,
+            "source_url": image_url,
+            "cache_key": cache_key
+        })
 
-        # If no inline image found, but we have text response, log for debugging
-        if text_response:
-            log_debug(f"Received text response: {text_response}")
+        # Return the local file path
+        logger.debug("Image saved to: %s", output_file_path)
+        return output_file_path
 
-        # If we reach here, no valid image was obtained
-        raise ValueError(
-            "No image data returned from Gemini. Please try a different prompt or image.")
+    # If no inline image found, but we have text response, log why
+    if text_response:
+        logger.warning("Received text response: %s", text_response)
 
-    finally:
-        # Clean up temporary file
-        try:
-            os.unlink(temp_file_path)
-        except:
-            pass
+    # If we reach here, no valid image was obtained
+    raise ValueError(
+        "No image data returned from Gemini. Please try a different prompt or image.")
 
 @mcp.tool()
-def generate_image_from_text(
+async def generate_image_from_text(
     prompt: str,
     temperature: float = 1.0,
     top_p: float = 0.95,
@@ -311,9 +688,20 @@ def generate_image_from_text(
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set")
 
+    # Return the earlier result of an identical request
+    model = "gemini-2.0-flash-exp-image-generation"
+    cache_key = response_cache_key(model, prompt, temperature, top_p, top_k)
+    cached_path = await asyncio.to_thread(get_cached_response, cache_key)
+    if cached_path:
+        logger.debug("Returning cached image: %s", cached_path)
+        return cached_path
+
     try:
-        # Initialize Gemini client
-        client = genai.Client(api_key=api_key)
+        # Get the shared Gemini client off the event loop
+        # (on first use this also loads google.genai, which takes a while)
+        client = await asyncio.to_thread(get_gemini_client, api_key)
+
+        from google.genai import types
 
         # Create content with just the text prompt
         contents = [
@@ -326,71 +714,84 @@ def generate_image_from_text(
         ]
 
         # Configure the generation request
-        generate_content_config = types.GenerateContentConfig(
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            max_output_tokens=8192,
-            response_modalities=["image", "text"],
-            response_mime_type="text/plain",
-        )
+        generate_content_config = get_generate_content_config(temperature, top_p, top_k)
 
-        # Use streaming to capture the response chunks
-        image_data = None
-        response_mime_type = None
-        text_response = ""
+        # Request the whole response at once, only a single image is expected
+        async with gemini_semaphore:
+            response = await client.aio.models.generate_content(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            )
 
-        # Process the streamed response
-        for chunk in client.models.generate_content_stream(
-            model="gemini-2.0-flash-exp-image-generation",
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
-                continue
-
-            # Check for inline image data
-            if hasattr(chunk.candidates[0].content.parts[0], 'inline_data') and chunk.candidates[0].content.parts[0].inline_data:
-                image_data = chunk.candidates[0].content.parts[0].inline_data.data
-                response_mime_type = chunk.candidates[0].content.parts[0].inline_data.mime_type
-                log_debug(f"Received inline image data: {response_mime_type}")
-                break  # Once we have the image, we can stop processing
-            # Accumulate text response
-            elif hasattr(chunk, 'text') and chunk.text:
-                text_response += chunk.text
+        image_data, response_mime_type, text_response = extract_image(response)
 
         # If we found inline image data
         if image_data:
             # Save generated image to a file for history tracking
-            import time
-            output_file_name = f"generated_{int(time.time())}.jpg"
+            output_file_name = f"generated_{time.time_ns()}_{os.urandom(3).hex()}.jpg"
             output_file_path = os.path.join(IMAGES_DIR, output_file_name)
 
-            # Save to file
-            with open(output_file_path, "wb") as f:
-                f.write(image_data)
+            # Save to file without blocking the event loop
+            await asyncio.to_thread(write_file, output_file_path, image_data)
 
-            # Store generated file info
-            file_id = f"gen_{len(generated_files)}"
-            generated_files[file_id] = {
+            # Remember it for identical requests and store generated file info
+            await asyncio.to_thread(cache_response, cache_key, output_file_path)
+            await track_generated_file({
                 "path": output_file_path,
                 "name": output_file_name,
                 "mime_type": response_mime_type or "image/jpeg",
-                "prompt": prompt
-            }
+                "prompt": prompt,
+                "cache_key": cache_key
+            })
 
             # Return the local file path
-            log_debug(f"Image saved to: {output_file_path}")
+            logger.debug("Image saved to: %s", output_file_path)
             return output_file_path
 
-        # If no inline image found, but we have text response, log for debugging
+        # If no inline image found, but we have text response, log why
         if text_response:
-            log_debug(f"Received text response: {text_response}")
+            logger.warning("Received text response: %s", text_response)
 
         # If we reach here, no valid image was obtained
         raise ValueError(
             "No image data returned from Gemini. Please try a different prompt.")
 
     except Exception as e:
-        log_debug(f"Error in generate_image_from_text: {str(e)}")
+        logger.error("Error in generate_image_from_text: %s", e)
         raise ValueError(f"Failed to generate image: {str(e)}")
+
+@mcp.tool()
+async def generate_images_from_texts(
+    prompts: list[str],
+    temperature: float = 1.0,
+    top_p: float = 0.95,
+    top_k: int = 40
+) -> str:
+    """
+    Generate several images at once using Gemini, one per text prompt.
+    Prompts are processed concurrently, so this is much faster than calling generate_image_from_text repeatedly.
+    Each prompt should be written the same way as for generate_image_from_text.
+    
+    Parameters:
+    - prompts: List of text instructions, one per image to generate
+    - temperature: Creativity parameter (0.0-1.0)
+    - top_p: Token selection parameter (0.0-1.0)
+    - top_k: Token selection parameter (1-100)
+    
+    Returns:
+    - String listing, for each prompt, the local file path of the generated image or the error that occurred
+    """
+    results = await asyncio.gather(
+        *[generate_image_from_text(prompt, temperature, top_p, top_k) for prompt in prompts],
+        return_exceptions=True
+    )
+
+    lines = ["Generated images:\n"]
+    for prompt, result in zip(prompts, results):
+        if isinstance(result, Exception):
+            logger.warning("Batch generation failed for prompt %r: %s", prompt, result)
+            lines.append(f"- {prompt}: Error: {str(result)}\n")
+        else:
+            lines.append(f"- {prompt}: {result}\n")
+    return "".join(lines)